@@ -98,8 +98,18 @@ class CharCNNLSTM(nn.Module):
         """
         enc_hiddens, dec_init_state = None, None
 
-        X = self.model_embeddings(source_padded)
-        X_packed = pack_padded_sequence(X, source_lengths, enforce_sorted=False)
+        # Pack the characters before embedding them, so that the char-CNN and highway
+        # layers only run on real words and not on sentence padding.
+        source_packed = pack_padded_sequence(
+            source_padded, source_lengths, enforce_sorted=False
+        )
+        X = self.model_embeddings(source_packed.data.unsqueeze(1)).squeeze(1)
+        X_packed = torch.nn.utils.rnn.PackedSequence(
+            X,
+            source_packed.batch_sizes,
+            source_packed.sorted_indices,
+            source_packed.unsorted_indices,
+        )
         enc_hiddens, (last_hidden, last_cell) = self.encoder(X_packed)
         (enc_hiddens, _) = pad_packed_sequence(enc_hiddens)
         enc_hiddens = enc_hiddens.permute(1, 0, 2)
@@ -3,9 +3,34 @@
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.nn.utils
 
 
+class ChannelsLastConv1d(nn.Conv1d):
+    """
+    Drop-in `nn.Conv1d` (same parameters and state dict) that runs the convolution as a
+    unit-height 2D convolution in channels_last (NHWC) memory format.
+
+    The char-CNN input is a permuted view of (batch_size, max_word_length, char_embed_size)
+    embeddings, i.e. its memory is channels-last already; `nn.Conv1d` would copy it back to
+    channels-first. Only the (small) weight is re-laid out on each call.
+    """
+
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        if self.padding_mode != "zeros" or isinstance(self.padding, str):
+            return super().forward(input)
+        return F.conv2d(
+            input.unsqueeze(2).contiguous(memory_format=torch.channels_last),
+            self.weight.unsqueeze(2).contiguous(memory_format=torch.channels_last),
+            self.bias,
+            (1,) + self.stride,
+            (0,) + self.padding,
+            (1,) + self.dilation,
+            self.groups,
+        ).squeeze(2)
+
+
 class CNN(nn.Module):
     """Convolutional network"""
 
@@ -25,7 +50,7 @@ class CNN(nn.Module):
         self.kernel_size = kernel_size
         self.max_word_length = max_word_length
 
-        self.conv1d = nn.Conv1d(
+        self.conv1d = ChannelsLastConv1d(
             in_channels=char_embed_size,
             out_channels=num_filters,
             kernel_size=kernel_size,
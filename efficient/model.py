@@ -1,14 +1,31 @@
 import os
-import random
 from collections import Counter
-from itertools import cycle
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from typing import List
 
+import numpy as np
 import torch
+import torch._inductor.config as inductor_config
+import torch.distributed as dist
 from torch import nn
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data.distributed import DistributedSampler
 
 from efficient.char_cnn_lstm import CharCNNLSTM
 from efficient.torch_model_base import TorchModelBase
+from efficient.utils import CUDAPrefetcher, pad_sents_char_array
+
+# Persist compiled graphs/kernels across runs so that only the first run
+# pays the full `torch.compile` cold-start cost.
+os.environ.setdefault(
+    "TORCHINDUCTOR_CACHE_DIR", os.path.expanduser("~/.cache/torchinductor-charcnnlstm")
+)
+inductor_config.fx_graph_cache = True
+
+
+def _is_main_process():
+    return not dist.is_initialized() or dist.get_rank() == 0
 
 
 class CharCNNLSTMModel(TorchModelBase):
@@ -20,9 +37,18 @@ class CharCNNLSTMModel(TorchModelBase):
         hidden_size,
         max_word_length,
         val_batch_size,
+        compile_model=True,
+        compile_mode="default",
         **model_kwargs,
     ):
         super().__init__(**model_kwargs)
+        if "LOCAL_RANK" in os.environ and self.device == torch.device("cuda"):
+            # Under `torchrun`, build the model on this rank's GPU directly
+            # rather than on GPU 0 (see `_setup_distributed`).
+            self.device = torch.device("cuda", int(os.environ["LOCAL_RANK"]))
+            torch.cuda.set_device(self.device)
+        self.compile_model = compile_model
+        self.compile_mode = compile_mode
         self.vocab = vocab
         self.char_embed_size = char_embed_size
         self.embed_size = embed_size
@@ -31,21 +57,163 @@ class CharCNNLSTMModel(TorchModelBase):
         self.val_batch_size = val_batch_size
         self.loss = nn.CrossEntropyLoss()
         self.model = self.build_graph()
+        self.inference_model = None
 
-    def build_graph(self):
+    def build_graph(self, device=None):
+        device = self.device if device is None else device
         return CharCNNLSTM(
             embed_size=self.embed_size,
             char_embed_size=self.char_embed_size,
             hidden_size=self.hidden_size,
             max_word_length=self.max_word_length,
             vocab=self.vocab,
-            device=self.device,
+            device=device,
+        ).to(device)
+
+    def build_inference_model(self, state_dict=None):
+        """An int8 dynamically quantized CPU model for fast CPU inference,
+        with the weights of `state_dict` (by default those of `self.model`).
+        The LSTM and linear layers are quantized; the character embedding
+        and char-CNN stay in fp32. The result is independent of
+        `self.model`, so callers keep it for as long as it is needed.
+        """
+        model = self.build_graph(device=torch.device("cpu"))
+        if state_dict is None:
+            state_dict = self.model.state_dict()
+        model.load_state_dict(state_dict)
+        model.eval()
+        return torch.ao.quantization.quantize_dynamic(
+            model, {nn.LSTM, nn.Linear}, dtype=torch.qint8
         )
 
+    def load_inference_model(self, path):
+        """Load a quantized model saved by `fit` (`best_model_int8.pkl`) as
+        `self.inference_model`, the model used by `predict` with
+        `inference_only=True`.
+        """
+        model = self.build_inference_model()
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+        self.inference_model = model
+        return model
+
     def build_dataset(self, contents, labels):
-        return Dataset(contents, labels, self.vocab, self.max_word_length, self.device)
+        return Dataset(contents, labels, self.vocab, self.max_word_length)
+
+    def _build_dataloader(self, dataset, shuffle=True):
+        """Like the base class, but whole batches are gathered by
+        `dataset[indices]` inside background worker processes so that
+        batch construction overlaps with the forward/backward pass. Under
+        `torchrun`, each process gets its own shard of `dataset` through a
+        `DistributedSampler`.
+        """
+        num_workers = min(8, (os.cpu_count() or 1) // 2)
+        worker_kwargs = {}
+        if num_workers > 0:
+            worker_kwargs = dict(persistent_workers=True, prefetch_factor=4)
+        if dist.is_initialized():
+            sampler = DistributedSampler(dataset, shuffle=shuffle)
+        elif shuffle:
+            sampler = torch.utils.data.RandomSampler(dataset)
+        else:
+            sampler = torch.utils.data.SequentialSampler(dataset)
+        # `batch_size=None` disables automatic batching: each index the
+        # loader receives from the `BatchSampler` is already a full batch.
+        return torch.utils.data.DataLoader(
+            dataset,
+            batch_size=None,
+            sampler=torch.utils.data.BatchSampler(
+                sampler, batch_size=self.batch_size, drop_last=False
+            ),
+            num_workers=num_workers,
+            pin_memory=self.device.type == "cuda",
+            **worker_kwargs,
+        )
+
+    def _build_train_step(self, model):
+        """The forward pass plus loss, compiled with TorchInductor when
+        `compile_model=True` so that the pointwise ops in the char-CNN and
+        LSTM are fused and kernel-launch overhead is reduced. With
+        `compile_mode="max-autotune-no-cudagraphs"`, Inductor also
+        benchmarks candidate kernels (e.g. for the conv + bias + ReLU +
+        max-pool chain) and keeps the fastest; this makes compilation
+        slower, so it is meant for long training runs. Run with
+        `TORCH_LOGS="+inductor"` to inspect the generated fused kernels.
+
+        The CUDA-graph modes ("reduce-overhead", "max-autotune") are not
+        a good fit here: sentence lengths, and so the number of packed
+        words, differ on almost every batch, and a CUDA graph is recorded
+        (and its memory kept) for each distinct shape.
+        """
+
+        def train_step(contents, labels, content_lengths):
+            pred = model(contents, content_lengths)
+            return pred, self.loss(pred, labels)
+
+        if not self.compile_model:
+            return train_step
+        if self.compile_mode.startswith("max-autotune"):
+            # `mode` and `options` are mutually exclusive, so spell the mode
+            # out as options. This scopes coordinate-descent tuning to this
+            # compilation instead of setting it process-wide.
+            options = dict(
+                torch._inductor.list_mode_options(self.compile_mode),
+                coordinate_descent_tuning=True,
+            )
+            return torch.compile(
+                train_step, options=options, fullgraph=False, dynamic=True
+            )
+        return torch.compile(
+            train_step, mode=self.compile_mode, fullgraph=False, dynamic=True
+        )
+
+    def _autocast(self):
+        """bf16 mixed precision for the forward pass on GPUs that support it.
+        Parameters and optimizer state stay in fp32 and, unlike fp16, bf16
+        needs no gradient scaling.
+        """
+        enabled = self.device.type == "cuda" and torch.cuda.is_bf16_supported()
+        return torch.autocast(
+            device_type=self.device.type, dtype=torch.bfloat16, enabled=enabled
+        )
+
+    @staticmethod
+    def _cycle_batches(dataloader):
+        """Endlessly yield batches, reshuffling on every pass."""
+        epoch = 0
+        while True:
+            sampler = dataloader.sampler.sampler
+            if isinstance(sampler, DistributedSampler):
+                sampler.set_epoch(epoch)
+            for batch in dataloader:
+                yield batch
+            epoch += 1
+
+    def _setup_distributed(self):
+        """If launched with `torchrun`, join the process group and pin this
+        process to its GPU. Returns whether training is distributed, and
+        whether the process group was created here (and so should be
+        destroyed by `fit`) rather than by the caller.
+        """
+        if "LOCAL_RANK" not in os.environ:
+            return False, False
+        owns_process_group = not dist.is_initialized()
+        if owns_process_group:
+            dist.init_process_group("nccl")
+        local_rank = int(os.environ["LOCAL_RANK"])
+        torch.cuda.set_device(local_rank)
+        self.device = torch.device("cuda", local_rank)
+        return True, owns_process_group
 
     def fit(self, contents, labels, checkpoint_path="checkpoints"):
+        """Train the model. Runs on a single device when started with
+        `python`, or data-parallel across GPUs when started with e.g.
+        `torchrun --nproc_per_node=N`; in the latter case only rank 0
+        logs, validates and writes checkpoints.
+        """
+        distributed, owns_process_group = self._setup_distributed()
+        is_main = _is_main_process()
+        # Training changes the weights, so any quantized copy is now stale
+        self.inference_model = None
 
         os.makedirs(checkpoint_path, exist_ok=True)
 
@@ -57,95 +225,276 @@ class CharCNNLSTMModel(TorchModelBase):
         ) = self._build_validation_split(contents, labels)
         self.train_set = self.build_dataset(train_contents, train_labels)
         self.val_set = self.build_dataset(val_contents, val_labels)
+        # The datasets hold their own encoded copies; don't keep the raw
+        # lists alive for the whole training loop.
+        del contents, labels, train_contents, train_labels, val_contents, val_labels
+        train_batches = CUDAPrefetcher(
+            self._cycle_batches(self._build_dataloader(self.train_set)), self.device
+        )
+        val_batches = CUDAPrefetcher(
+            self._cycle_batches(
+                torch.utils.data.DataLoader(
+                    self.val_set,
+                    batch_size=None,
+                    sampler=torch.utils.data.BatchSampler(
+                        torch.utils.data.RandomSampler(self.val_set),
+                        batch_size=self.val_batch_size,
+                        drop_last=False,
+                    ),
+                    pin_memory=self.device.type == "cuda",
+                )
+            ),
+            self.device,
+        )
 
+        if distributed:
+            # A no-op unless an explicit `device` disagreed with the local rank
+            self.model.to(self.device)
+            self.model.device = self.device
+        param_device = next(self.model.parameters()).device
+        assert param_device.type == self.device.type and self.device.index in (
+            None,
+            param_device.index,
+        )
         self.optimizer = self.build_optimizer()
 
-        self.optimizer.zero_grad()
-        self.model.to(self.device)
+        self.optimizer.zero_grad(set_to_none=True)
         self.model.train()
-
-        best_accuracy = 0
-        for iter_step in range(1, self.max_iter + 1):
-            total_losses = 0.0
-
-            for batch_step in range(1, 20):
-                contents, labels, content_lengths = self.train_set[self.batch_size]
-                labels = labels.to(self.device)
-                pred = self.model(contents, content_lengths)
-                losses = self.loss(pred, labels)
-                losses.backward()
-                total_losses += losses.item()
-                if self.max_grad_norm is not None:
-                    torch.nn.utils.clip_grad_norm_(
-                        self.model.parameters(), self.max_grad_norm
-                    )
-                self.optimizer.step()
-                self.optimizer.zero_grad()
-
-            # Only on last batch step
-            predicted_labels = torch.argmax(pred, dim=1)
-            accuracy = float((predicted_labels == labels).float().mean())
-
-            val_contents, val_labels, val_content_lengths = self.val_set[
-                self.val_batch_size
-            ]
-            val_labels = val_labels.to(self.device)
-            val_losses, val_accuracy = self.predict(
-                val_contents, val_labels, val_content_lengths
+        train_model = self.model
+        if distributed:
+            # `att_projection`, `combined_output_projection` and `c_projection`
+            # never contribute to the loss (they are kept for checkpoint
+            # compatibility). The set of unused parameters is the same every
+            # step, so `static_graph` lets DDP skip them without the per-step
+            # graph traversal of `find_unused_parameters=True`.
+            train_model = DDP(
+                self.model,
+                device_ids=[self.device.index],
+                gradient_as_bucket_view=True,
+                bucket_cap_mb=25,
+                static_graph=True,
             )
-            print(
-                "Iter:",
-                iter_step,
-                "train loss:",
-                losses.item(),
-                "train acc:",
-                accuracy,
-                "sampled val loss:",
-                val_losses,
-                "sampled val acc:",
-                val_accuracy,
-            )
-            if iter_step % 10 == 0:
-                model_path = f"{checkpoint_path}/model_iter_{iter_step}.pkl"
-                torch.save(self.model.state_dict(), model_path)
-                print("Model saved to:", model_path)
-
-                val_accuracies = []
-                # This will drop few examples
-                for batch_index in range(0, len(self.val_set), self.val_batch_size):
-                    batch_contents, batch_labels, batch_content_lengths = self.val_set[
-                        self.val_batch_size
-                    ]
-                    _, accuracy = self.predict(
-                        batch_contents, batch_labels, batch_content_lengths
+        train_step = self._build_train_step(train_model)
+
+        # Checkpoints are serialized on a background thread so that writing
+        # them to disk does not stall training.
+        checkpoint_pool = ThreadPoolExecutor(max_workers=1)
+        pending_checkpoints = []
+
+        try:
+            best_accuracy = 0
+            for iter_step in range(1, self.max_iter + 1):
+                # Accumulate metrics on the device and only sync once per
+                # iteration, when logging.
+                total_losses = torch.zeros((), device=self.device)
+                correct = torch.zeros((), device=self.device, dtype=torch.long)
+                seen = 0
+
+                for batch_step in range(1, 20):
+                    contents, labels, content_lengths = train_batches.next()
+                    update = (
+                        batch_step % self.gradient_accumulation_steps == 0
+                        or batch_step == 19
+                    )
+                    # The last accumulation window is shorter when 19 is not a
+                    # multiple of `gradient_accumulation_steps`.
+                    window_start = batch_step - (
+                        (batch_step - 1) % self.gradient_accumulation_steps
+                    )
+                    window_size = min(
+                        self.gradient_accumulation_steps, 19 - window_start + 1
                     )
-                    val_accuracies.append(accuracy)
-
-                total_val_accuracy = sum(val_accuracies) / len(val_accuracies)
-
-                if total_val_accuracy > best_accuracy:
-                    best_accuracy = total_val_accuracy
-                    best_model_path = f"{checkpoint_path}/best_model.pkl"
-                    torch.save(self.model.state_dict(), best_model_path)
-                    print(
-                        "Best model saved to:",
-                        best_model_path,
-                        "with total validation accuracy:",
-                        best_accuracy,
+                    # Under DDP, only all-reduce gradients on the micro-batch
+                    # that is followed by an optimizer step.
+                    sync_context = nullcontext()
+                    if distributed and not update:
+                        sync_context = train_model.no_sync()
+                    with sync_context:
+                        with self._autocast():
+                            pred, losses = train_step(contents, labels, content_lengths)
+                        total_losses += losses.detach()
+                        if window_size > 1:
+                            losses = losses / window_size
+                        losses.backward()
+                    correct += (torch.argmax(pred, dim=1) == labels).sum()
+                    seen += len(labels)
+
+                    if update:
+                        if self.max_grad_norm is not None:
+                            torch.nn.utils.clip_grad_norm_(
+                                self.model.parameters(),
+                                self.max_grad_norm,
+                                foreach=True,
+                            )
+                        self.optimizer.step()
+                        self.optimizer.zero_grad(set_to_none=True)
+
+                if distributed:
+                    world_size = dist.get_world_size()
+                    dist.all_reduce(total_losses, op=dist.ReduceOp.SUM)
+                    dist.all_reduce(correct, op=dist.ReduceOp.SUM)
+                    total_losses /= world_size
+                    seen *= world_size
+
+                if not is_main:
+                    continue
+
+                val_contents, val_labels, val_content_lengths = next(val_batches)
+                val_losses, val_accuracy = self.predict(
+                    val_contents, val_labels, val_content_lengths
+                )
+                print(
+                    "Iter:",
+                    iter_step,
+                    "train loss:",
+                    total_losses.item() / batch_step,
+                    "train acc:",
+                    correct.item() / seen,
+                    "sampled val loss:",
+                    val_losses,
+                    "sampled val acc:",
+                    val_accuracy,
+                )
+                if iter_step % 10 == 0:
+                    # Report (or raise) writes that finished since the last
+                    # checkpoint instead of only at the end of training.
+                    pending_checkpoints = self._finish_checkpoints(
+                        pending_checkpoints
                     )
+                    model_path = f"{checkpoint_path}/model_iter_{iter_step}.pkl"
+                    pending_checkpoints.append(
+                        (
+                            self._save_checkpoint(checkpoint_pool, model_path),
+                            ("Model saved to:", model_path),
+                        )
+                    )
+
+                    # One ordered pass over the whole validation set, switching
+                    # the model to eval mode once rather than once per batch.
+                    num_correct = 0.0
+                    with self._evaluating():
+                        for batch in self.val_set.iter_batches(self.val_batch_size):
+                            _, accuracy = self.predict(*batch)
+                            num_correct += accuracy * len(batch[1])
+
+                    total_val_accuracy = num_correct / len(self.val_set)
+
+                    if total_val_accuracy > best_accuracy:
+                        best_accuracy = total_val_accuracy
+                        best_model_path = f"{checkpoint_path}/best_model.pkl"
+                        best_state = self._cpu_state_dict()
+                        pending_checkpoints.append(
+                            (
+                                checkpoint_pool.submit(
+                                    torch.save,
+                                    best_state,
+                                    best_model_path,
+                                    pickle_protocol=5,
+                                ),
+                                (
+                                    "Best model saved to:",
+                                    best_model_path,
+                                    "with total validation accuracy:",
+                                    best_accuracy,
+                                ),
+                            )
+                        )
+                        # Quantizing is done in the background too, from the
+                        # same CPU snapshot. Load it with `load_inference_model`.
+                        int8_model_path = f"{checkpoint_path}/best_model_int8.pkl"
+                        pending_checkpoints.append(
+                            (
+                                checkpoint_pool.submit(
+                                    self._save_inference_model,
+                                    best_state,
+                                    int8_model_path,
+                                ),
+                                ("Quantized best model saved to:", int8_model_path),
+                            )
+                        )
+
+            self._finish_checkpoints(pending_checkpoints, wait=True)
+        finally:
+            checkpoint_pool.shutdown()
+
+        if owns_process_group:
+            dist.destroy_process_group()
+
+    def _cpu_state_dict(self):
+        """A CPU copy of the current parameters, unaffected by later
+        training steps.
+        """
+        return {
+            k: v.detach().to("cpu", copy=True)
+            for k, v in self.model.state_dict().items()
+        }
+
+    def _save_checkpoint(self, pool, path):
+        """Snapshot the parameters to the CPU now, and write them to `path`
+        on `pool`. Returns the `Future` of the write.
+        """
+        return pool.submit(torch.save, self._cpu_state_dict(), path, pickle_protocol=5)
 
-    def predict(self, contents, labels, content_lengths):
-        self.model.eval()
-        self.model.to(self.device)
-        with torch.no_grad():
-            contents = contents.to(self.device)
-            labels = labels.to(self.device)
+    def _save_inference_model(self, state_dict, path):
+        torch.save(self.build_inference_model(state_dict).state_dict(), path)
 
-            pred = self.model(contents, content_lengths)
-            losses = self.loss(pred, labels).item()
+    @staticmethod
+    def _finish_checkpoints(pending_checkpoints, wait=False):
+        """Print the message of every finished checkpoint write in
+        `pending_checkpoints`, a list of `(future, print_args)` pairs, and
+        re-raise the error of any write that failed. With `wait=True`,
+        block until all writes are done. Returns the still-pending pairs.
+        """
+        still_pending = []
+        for future, print_args in pending_checkpoints:
+            if wait or future.done():
+                future.result()
+                print(*print_args)
+            else:
+                still_pending.append((future, print_args))
+        return still_pending
+
+    @contextmanager
+    def _evaluating(self):
+        """Put the model in eval mode under `torch.inference_mode` and
+        restore training mode on exit. Nested uses are no-ops, so a caller
+        can wrap many `predict` calls and only toggle the modules once.
+        """
+        was_training = self.model.training
+        if was_training:
+            self.model.eval()
+        try:
+            with torch.inference_mode():
+                yield
+        finally:
+            if was_training:
+                self.model.train()
+
+    def predict(self, contents, labels, content_lengths, inference_only=False):
+        """Return the loss and accuracy on one batch. With
+        `inference_only=True`, an int8 quantized CPU copy of the current
+        `self.model` is used instead: `self.inference_model`, which is
+        built on first use and kept until `fit` is called again. After
+        changing the weights any other way, set it with
+        `build_inference_model` or `load_inference_model`.
+        """
+        model, device, autocast = self.model, self.device, self._autocast()
+        if inference_only:
+            if self.inference_model is None:
+                self.inference_model = self.build_inference_model()
+            model, device = self.inference_model, torch.device("cpu")
+            autocast = nullcontext()
+        with self._evaluating():
+            contents = contents.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+
+            with autocast:
+                pred = model(contents, content_lengths)
+                losses = self.loss(pred, labels)
             predicted_labels = torch.argmax(pred, dim=1)
-            accuracy = float((predicted_labels == labels).float().mean())
-        self.model.train()
+            accuracy = (predicted_labels == labels).float().mean()
+            # A single device sync for both metrics
+            losses, accuracy = torch.stack([losses, accuracy]).tolist()
         return losses, accuracy
 
     @staticmethod
@@ -154,56 +503,82 @@ class CharCNNLSTMModel(TorchModelBase):
         """
 
         assert len(contents) == len(labels)
-        all_train = list(zip(contents, labels))
-        random.seed(0)
-        random.shuffle(all_train)
-        split_index = int(len(all_train) * validation_fraction)
-
-        train = all_train[split_index:]
-        val = all_train[:split_index]
+        num_examples = len(contents)
+        val_size = int(num_examples * validation_fraction)
+        in_val = np.zeros(num_examples, dtype=bool)
+        rng = np.random.default_rng(0)
+        in_val[rng.permutation(num_examples)[:val_size]] = True
+        val_idx, train_idx = np.flatnonzero(in_val), np.flatnonzero(~in_val)
 
-        train_contents = [c for c, l in train]
-        train_labels = [l for c, l in train]
+        train_contents = [contents[i] for i in train_idx]
+        train_labels = np.asarray(labels)[train_idx].tolist()
 
-        val_contents = [c for c, l in val]
-        val_labels = [l for c, l in val]
+        val_contents = [contents[i] for i in val_idx]
+        val_labels = np.asarray(labels)[val_idx].tolist()
 
-        print(
-            "train set distribution:",
-            sorted(Counter(train_labels).most_common(), key=lambda x: x[0]),
-        )
-        print(
-            "val set distribution:",
-            sorted(Counter(val_labels).most_common(), key=lambda x: x[0]),
-        )
+        if _is_main_process():
+            print(
+                "train set distribution:",
+                sorted(Counter(train_labels).most_common(), key=lambda x: x[0]),
+            )
+            print(
+                "val set distribution:",
+                sorted(Counter(val_labels).most_common(), key=lambda x: x[0]),
+            )
 
         return train_contents, train_labels, val_contents, val_labels
 
 
 class Dataset(torch.utils.data.Dataset):
     def __init__(
-        self, contents: List[str], labels: List[int], vocab, max_word_length, device
+        self, contents: List[List[str]], labels: List[int], vocab, max_word_length
     ):
-        self.contents = contents
-        self.labels = labels
-        assert len(self.contents) == len(self.labels)
-        self.data_generator = iter(cycle(list(zip(self.contents, self.labels))))
+        assert len(contents) == len(labels)
         self.vocab = vocab
         self.max_word_length = max_word_length
-        self.device = device
-
-    def __getitem__(self, batch_size=3):
-        batch_data = [next(self.data_generator) for _ in range(batch_size)]
-        batch_contents = [c for c, l in batch_data]
-        batch_labels = [l for c, l in batch_data]
-
-        batch_labels = torch.tensor(batch_labels) - 1  # original labels are [1,2,3,4]
-        batch_contents_lengths = [len(s) for s in batch_contents]
-        batch_contents = self.vocab.src.to_input_tensor_char(
-            batch_contents, max_word_length=self.max_word_length, device=self.device
+        self.pad_id = self.vocab.src.char2id["<pad>"]
+        # original labels are [1,2,3,4]
+        self.labels_tensor = torch.tensor(labels, dtype=torch.long) - 1
+
+        # Encode every word of the dataset once, up front. `char_ids` holds the
+        # padded characters of all words back to back and example `i` owns rows
+        # `offsets[i]:offsets[i + 1]`. With the default vocabulary it is uint8,
+        # i.e. `max_word_length` bytes per word, roughly half of a short `str`
+        # plus its list slot. Only these flat arrays are kept, not the nested
+        # lists of strings, and unlike Python objects they are shared with
+        # forked DataLoader workers without refcount-triggered copy-on-write.
+        self.lengths = np.array([len(s) for s in contents], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        self.char_ids = self.vocab.src.words2charindices_array(
+            [w for s in contents for w in s], self.max_word_length
         )
 
-        return batch_contents, batch_labels, batch_contents_lengths
+    def __getitem__(self, indices):
+        """Gather a whole batch of examples as model inputs: the character
+        tensor of shape (max_sentence_length, batch_size, max_word_length),
+        the 0-based labels and the sentence lengths. Tensors are built on
+        the CPU and moved to the device by the training loop.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        batch_contents_lengths = self.lengths[indices]
+        # Rows of `char_ids` that belong to the selected examples, in order
+        starts = np.cumsum(batch_contents_lengths) - batch_contents_lengths
+        rows = np.arange(batch_contents_lengths.sum()) + np.repeat(
+            self.offsets[indices] - starts, batch_contents_lengths
+        )
+        batch_contents = pad_sents_char_array(
+            self.char_ids[rows], batch_contents_lengths, self.pad_id
+        )
+        return (
+            torch.from_numpy(batch_contents),
+            self.labels_tensor[torch.from_numpy(indices)],
+            batch_contents_lengths.tolist(),
+        )
 
     def __len__(self):
-        return len(self.labels)
+        return len(self.lengths)
+
+    def iter_batches(self, batch_size):
+        """Yield batches covering the dataset once, in order."""
+        for start in range(0, len(self), batch_size):
+            yield self[range(start, min(start + batch_size, len(self)))]
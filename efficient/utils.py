@@ -45,6 +45,30 @@ def pad_sents_char(sents, char_pad_token, max_word_length=50):
     return sents_padded
 
 
+def pad_sents_char_array(words_char_ids, sent_lengths, char_pad_token):
+    """ Vectorized `pad_sents_char()` for words that are already padded to max_word_length.
+    @param words_char_ids (np.ndarray): character indices of all words of all sentences,
+        back to back. Shape (total_words, max_word_length)
+    @param sent_lengths (list[int]): number of words in each sentence
+    @param char_pad_token (int): index of the character-padding token
+    @returns sents_padded (np.ndarray): int64 array where sentences shorter than the max length
+        sentence are padded out with words made of char_pad_token.
+        Output shape: (max_sentence_length, batch_size, max_word_length)
+    """
+    sent_lengths = np.asarray(sent_lengths, dtype=np.int64)
+    batch_size, max_word_length = len(sent_lengths), words_char_ids.shape[1]
+    sents_padded = np.full(
+        (sent_lengths.max(), batch_size, max_word_length),
+        char_pad_token,
+        dtype=np.int64,
+    )
+    sent_index = np.repeat(np.arange(batch_size), sent_lengths)
+    starts = np.cumsum(sent_lengths) - sent_lengths
+    word_index = np.arange(len(sent_index)) - np.repeat(starts, sent_lengths)
+    sents_padded[word_index, sent_index] = words_char_ids
+    return sents_padded
+
+
 def pad_sents(sents, pad_token):
     """ Pad list of sentences according to the longest sentence in the batch.
     @param sents (list[list[int]]): list of sentences, where each sentence
@@ -137,3 +161,57 @@ def progress_bar(msg, verbose=True):
         sys.stderr.write("\r")
         sys.stderr.write(msg)
         sys.stderr.flush()
+
+
+class CUDAPrefetcher:
+    """
+    Wrap an iterator of batches and copy the next batch to `device` on a
+    side CUDA stream while the current batch is being consumed. Tensors in
+    each batch are moved; anything else (e.g. a list of lengths) is passed
+    through untouched. The source batches should be in pinned memory
+    (`DataLoader(..., pin_memory=True)`) for the copies to be asynchronous.
+    On a non-CUDA device batches are simply moved synchronously.
+    """
+
+    def __init__(self, loader, device):
+        self.device = torch.device(device)
+        self.stream = (
+            torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+        )
+        self.loader = iter(loader)
+        self._preload()
+
+    def _to_device(self, batch):
+        return tuple(
+            x.to(self.device, non_blocking=True) if torch.is_tensor(x) else x
+            for x in batch
+        )
+
+    def _preload(self):
+        try:
+            batch = next(self.loader)
+        except StopIteration:
+            self.batch = None
+            return
+        if self.stream is None:
+            self.batch = self._to_device(batch)
+            return
+        with torch.cuda.stream(self.stream):
+            self.batch = self._to_device(batch)
+
+    def next(self):
+        if self.batch is None:
+            raise StopIteration
+        if self.stream is not None:
+            torch.cuda.current_stream(self.device).wait_stream(self.stream)
+            for x in self.batch:
+                if torch.is_tensor(x):
+                    x.record_stream(torch.cuda.current_stream(self.device))
+        batch = self.batch
+        self._preload()
+        return batch
+
+    __next__ = next
+
+    def __iter__(self):
+        return self
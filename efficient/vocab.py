@@ -7,9 +7,10 @@ from collections import Counter
 from itertools import chain
 from typing import List
 
+import numpy as np
 import torch
 
-from .utils import pad_sents, pad_sents_char, read_corpus
+from .utils import pad_sents, pad_sents_char_array, read_corpus
 
 
 class VocabEntry(object):
@@ -98,6 +99,46 @@ class VocabEntry(object):
             word_ids.append(word_list)
         return word_ids
 
+    def words2charindices_array(
+        self, words: List[str], max_word_length: int
+    ) -> np.ndarray:
+        """ Vectorized equivalent of `words2charindices()` followed by the word-level
+        padding of `pad_sents_char()`, for a flat list of words. Characters outside
+        the vocabulary map to the unk index.
+        @param words (List[str]): words to convert
+        @param max_word_length (int): length each word is padded/truncated to
+        @returns char_ids (np.ndarray): array of shape (len(words), max_word_length), using
+            the smallest unsigned integer type that holds every index (uint8 by default)
+        """
+        lengths = np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words))
+        codes = np.frombuffer("".join(words).encode("utf-32-le"), dtype=np.uint32)
+        # Code point -> index lookup table covering every single-character entry
+        chars = [c for c in self.char2id if len(c) == 1]
+        lut = np.full(max(map(ord, chars)) + 1, self.char_unk, dtype=np.int32)
+        lut[[ord(c) for c in chars]] = [self.char2id[c] for c in chars]
+        ids = np.where(
+            codes < len(lut), lut[np.minimum(codes, len(lut) - 1)], self.char_unk
+        )
+
+        char_ids = np.full(
+            (len(words), max_word_length),
+            self.char2id["<pad>"],
+            dtype=np.min_scalar_type(max(self.char2id.values())),
+        )
+        char_ids[:, :1] = self.start_of_word
+
+        # Column of every character: 1 + its offset within its word
+        word_index = np.repeat(np.arange(len(words)), lengths)
+        starts = np.cumsum(lengths) - lengths
+        position = np.arange(len(codes)) - np.repeat(starts, lengths) + 1
+        keep = position < max_word_length
+        char_ids[word_index[keep], position[keep]] = ids[keep]
+
+        end_position = lengths + 1
+        keep = end_position < max_word_length
+        char_ids[np.flatnonzero(keep), end_position[keep]] = self.end_of_word
+        return char_ids
+
     def to_input_tensor_char(
         self, sents: List[List[str]], max_word_length: int, device: torch.device
     ) -> torch.Tensor:
@@ -109,21 +150,13 @@ class VocabEntry(object):
 
         @returns sents_var: tensor of (max_sentence_length, batch_size, max_word_length)
         """
-        ###     Connect `words2charindices()` and `pad_sents_char()` which you've defined in
-        ###     previous parts
-        sents_id = self.words2charindices(sents)
-        sents_id = pad_sents_char(
-            sents_id, self.char2id["<pad>"], max_word_length=max_word_length
+        words_char_ids = self.words2charindices_array(
+            [word for sent in sents for word in sent], max_word_length
+        )
+        sents_id = pad_sents_char_array(
+            words_char_ids, [len(sent) for sent in sents], self.char2id["<pad>"]
         )
-        try:
-            sents_id = torch.tensor(sents_id, dtype=torch.long, device=device).permute(
-                1, 0, 2
-            )
-        except ValueError:
-            for sent in sents_id:
-                for word in sent:
-                    print(len(word), word)
-        return sents_id
+        return torch.from_numpy(sents_id).to(device, non_blocking=True)
 
 
 class Vocab(object):
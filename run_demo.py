@@ -20,10 +20,9 @@ def demo(
     vocab = Vocab.load(vocab_path)
 
     predictor = CharCNNLSTMModel(vocab, **model_config)
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    predictor.model.load_state_dict(
-        torch.load(model_path, map_location=torch.device(device))
-    )
+    # `build_graph` already placed the model on `predictor.device`
+    device = predictor.device
+    predictor.model.load_state_dict(torch.load(model_path, map_location=device))
 
     test_contents = read_corpus(test_contents_path)
     test_labels = read_labels(test_label_path)
@@ -37,13 +36,15 @@ def demo(
     demo_raw_contents = [r for c, l, r in demo_data]
 
     demo_dataset = Dataset(
-        demo_contents, demo_labels, vocab, model_config.get("max_word_length"), "cpu"
+        demo_contents, demo_labels, vocab, model_config.get("max_word_length")
     )
 
-    demo_contents, demo_labels, demo_contents_lengths = demo_dataset[len(demo_dataset)]
+    demo_contents, demo_labels, demo_contents_lengths = next(
+        demo_dataset.iter_batches(len(demo_dataset))
+    )
 
     with torch.no_grad():
-        pred = predictor.model(demo_contents, demo_contents_lengths)
+        pred = predictor.model(demo_contents.to(device), demo_contents_lengths)
         predicted_labels = torch.argmax(pred, dim=1)
 
     for content, gt, pr in zip(demo_raw_contents, demo_labels, predicted_labels):
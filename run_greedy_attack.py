@@ -12,12 +12,10 @@ from efficient.vocab import Vocab
 def setup(vocab_path, model_path, contents_path, label_path, model_config):
     vocab = Vocab.load(vocab_path)
     predictor = CharCNNLSTMModel(vocab, **model_config)
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    predictor.model.load_state_dict(
-        torch.load(model_path, map_location=torch.device(device))
-    )
+    # `build_graph` already placed the model on `predictor.device`
+    device = predictor.device
+    predictor.model.load_state_dict(torch.load(model_path, map_location=device))
     model = predictor.model
-    model.to(device)
     model_embedding = model.model_embeddings
     test_contents = read_corpus(contents_path)
     test_labels = read_labels(label_path)
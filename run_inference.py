@@ -10,25 +10,20 @@ def infer(model_path, vocab_path, test_contents_path, test_label_path, **model_c
     test_contents = read_corpus(test_contents_path)
     test_labels = read_labels(test_label_path)
     test_dataset = Dataset(
-        test_contents, test_labels, vocab, model_config.get("max_word_length"), "cpu"
+        test_contents, test_labels, vocab, model_config.get("max_word_length")
     )
     predictor = CharCNNLSTMModel(vocab, **model_config)
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    predictor.model.load_state_dict(
-        torch.load(model_path, map_location=torch.device(device))
-    )
+    # `build_graph` already placed the model on `predictor.device`
+    device = predictor.device
+    predictor.model.load_state_dict(torch.load(model_path, map_location=device))
 
     batch_size = 20
-    accuracies = []
-    # This will drop the last few examples (<= 19)
-    for batch_index in range(0, len(test_labels), batch_size):
-        batch_contents, batch_labels, batch_content_lengths = test_dataset[batch_size]
-        _, accuracy = predictor.predict(
-            batch_contents, batch_labels, batch_content_lengths
-        )
-        accuracies.append(accuracy)
-
-    print("test accuracy:", sum(accuracies) / len(accuracies))
+    num_correct = 0.0
+    for batch in test_dataset.iter_batches(batch_size):
+        _, accuracy = predictor.predict(*batch)
+        num_correct += accuracy * len(batch[1])
+
+    print("test accuracy:", num_correct / len(test_dataset))
 
 
 if __name__ == "__main__":
@@ -26,5 +26,6 @@ if __name__ == "__main__":
         max_grad_norm=1,
         max_iter=2000,
         val_batch_size=100,
+        compile_mode="max-autotune-no-cudagraphs",
     )
     train(vocab_path, train_contents_path, train_label_path, **model_config)
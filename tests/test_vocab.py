@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from efficient.utils import pad_sents_char, pad_sents_char_array
+from efficient.vocab import VocabEntry
+
+
+def _default_char2id_with(*extra_chars):
+    char2id = dict(VocabEntry().char2id)
+    for c in extra_chars:
+        char2id[c] = len(char2id)
+    return char2id
+
+
+@pytest.mark.parametrize("max_word_length", [3, 8, 30])
+@pytest.mark.parametrize(
+    "char2id", [None, _default_char2id_with("é", "Ā", "€")], ids=["default", "custom"]
+)
+def test_words2charindices_array_matches_reference(char2id, max_word_length):
+    entry = VocabEntry(char2id)
+    sents = [
+        ["<s>", "Hello", "World", "</s>"],
+        ["<s>", "a", "</s>"],
+        ["<s>", "Supercalifragilisticexpialidocious!", "x", "y", "</s>"],
+    ]
+    if char2id is not None:
+        sents.append(["<s>", "café", "Ā€", "</s>"])
+    pad = entry.char2id["<pad>"]
+
+    expected = pad_sents_char(
+        entry.words2charindices(sents), pad, max_word_length=max_word_length
+    )
+    words_char_ids = entry.words2charindices_array(
+        [w for s in sents for w in s], max_word_length
+    )
+    actual = pad_sents_char_array(words_char_ids, [len(s) for s in sents], pad)
+
+    # pad_sents_char is batch-major, pad_sents_char_array is sentence-major
+    np.testing.assert_array_equal(actual.transpose(1, 0, 2), np.array(expected))
+
+
+def test_words2charindices_array_maps_out_of_vocabulary_to_unk():
+    entry = VocabEntry()
+    char_ids = entry.words2charindices_array(["aé€"], max_word_length=8)
+    assert list(char_ids[0, :5]) == [
+        entry.start_of_word,
+        entry.char2id["a"],
+        entry.char_unk,
+        entry.char_unk,
+        entry.end_of_word,
+    ]